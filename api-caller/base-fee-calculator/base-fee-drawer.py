@@ -10,111 +10,126 @@ import numpy as np
 import argparse
 import os
 from datetime import datetime
-from decimal import Decimal, getcontext
-
-# Set precision for decimal arithmetic
-getcontext().prec = 50
+from numba import njit
 
 # EIP-1559 constants
 DENOMINATOR = 250           # denominator for base fee calculation
 
-def calculate_base_fee(parent_base_fee, parent_gas_used, parent_gas_limit, elasticity, denominator=None):
+INT64_MAX = np.iinfo(np.int64).max
+
+def wei_to_gwei(wei):
+    """Convert wei to gwei"""
+    return wei / 1e9
+
+def gwei_to_wei(gwei):
+    """Convert gwei to wei"""
+    return int(gwei * 1e9)
+
+@njit(cache=True)
+def _recurrence(gas_used, gas_limit, elasticity, denominator, init_wei):
     """
-    Calculate base fee using EIP-1559 formula based on parent block's data
+    Run the EIP-1559 base fee recurrence over a block series with integer semantics
     
     Args:
-        parent_base_fee: Parent block's base fee in wei
-        parent_gas_used: Parent block's gas used
-        parent_gas_limit: Parent block's gas limit
+        gas_used: Gas used per block
+        gas_limit: Gas limit per block
         elasticity: Elasticity multiplier
-        denominator: Denominator value (defaults to global DENOMINATOR if None)
+        denominator: Denominator value
+        init_wei: Base fee of the first block in wei
     
     Returns:
-        New base fee in wei for the current block
+        int64 array with the base fee in wei for every block
+    
+    Raises:
+        OverflowError: If the base fee grows beyond the int64 range
     """
-    if denominator is None:
-        denominator = DENOMINATOR
+    n = len(gas_used)
+    base_fees_wei = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return base_fees_wei
+    
+    # First block uses initial base fee
+    base_fee = np.int64(init_wei)
+    base_fees_wei[0] = base_fee
+    
+    for i in range(1, n):
+        # Parent block's data is the previous element
+        parent_gas_used = np.int64(gas_used[i - 1])
+        target_gas_used = np.int64(gas_limit[i - 1]) // elasticity
         
-    target_gas_used = parent_gas_limit // elasticity
-    
-    if parent_gas_used == target_gas_used:
-        return parent_base_fee
-    
-    # Convert to Decimal for arbitrary-precision arithmetic
-    parent_base_fee_dec = Decimal(str(parent_base_fee))
-    gas_used_delta_dec = Decimal(str(abs(parent_gas_used - target_gas_used)))
-    target_gas_used_dec = Decimal(str(target_gas_used))
-    denominator_dec = Decimal(str(denominator))
-    
-    # Calculate the adjustment factor based on parent block's data
-    if parent_gas_used > target_gas_used:
-        # Parent block used more gas than target, increase base fee
-        base_fee_delta = int((parent_base_fee_dec * gas_used_delta_dec) / (target_gas_used_dec * denominator_dec))
-        return parent_base_fee + max(base_fee_delta, 1)
-    else:
-        # Parent block used less gas than target, decrease base fee
-        base_fee_delta = int((parent_base_fee_dec * gas_used_delta_dec) / (target_gas_used_dec * denominator_dec))
-        return max(parent_base_fee - base_fee_delta, 0)
-
-def wei_to_gwei(wei):
-    """Convert wei to gwei"""
-    return wei / 1e9
+        if parent_gas_used != target_gas_used:
+            gas_used_delta = abs(parent_gas_used - target_gas_used)
+            # Split base_fee by the divisor so (base_fee * gas_used_delta) // divisor is
+            # computed exactly without forming the full product
+            divisor = target_gas_used * denominator
+            quotient, remainder = divmod(base_fee, divisor)
+            if quotient > INT64_MAX // gas_used_delta or remainder > INT64_MAX // gas_used_delta:
+                raise OverflowError("Base fee delta does not fit in int64")
+            base_fee_delta = quotient * gas_used_delta + (remainder * gas_used_delta) // divisor
+            
+            if parent_gas_used > target_gas_used:
+                # Parent block used more gas than target, increase base fee
+                base_fee_delta = max(base_fee_delta, 1)
+                if base_fee > INT64_MAX - base_fee_delta:
+                    raise OverflowError("Base fee does not fit in int64")
+                base_fee = base_fee + base_fee_delta
+            else:
+                # Parent block used less gas than target, decrease base fee
+                base_fee = max(base_fee - base_fee_delta, 0)
+        
+        base_fees_wei[i] = base_fee
+    
+    return base_fees_wei
 
-def gwei_to_wei(gwei):
-    """Convert gwei to wei"""
-    return int(gwei * 1e9)
+def _recurrence_exact(gas_used, gas_limit, elasticity, denominator, init_wei):
+    """
+    Same recurrence as _recurrence on unbounded Python integers, for series whose
+    base fee outgrows int64
+    
+    Returns:
+        List with the base fee in wei for every block
+    """
+    if len(gas_used) == 0:
+        return []
+    
+    base_fee = init_wei
+    base_fees_wei = [base_fee]
+    
+    for parent_gas_used, parent_gas_limit in zip(gas_used[:-1].tolist(), gas_limit[:-1].tolist()):
+        target_gas_used = parent_gas_limit // elasticity
+        
+        if parent_gas_used > target_gas_used:
+            base_fee_delta = (base_fee * (parent_gas_used - target_gas_used)) // (target_gas_used * denominator)
+            base_fee = base_fee + max(base_fee_delta, 1)
+        elif parent_gas_used < target_gas_used:
+            base_fee_delta = (base_fee * (target_gas_used - parent_gas_used)) // (target_gas_used * denominator)
+            base_fee = max(base_fee - base_fee_delta, 0)
+        
+        base_fees_wei.append(base_fee)
+    
+    return base_fees_wei
 
 def calculate_base_fees_for_elasticity(df_clean, initial_base_fee_gwei, elasticity, denominator=None):
     """Calculate base fees for a specific elasticity value"""
-    base_fees_gwei = []
-    prev_base_fee_wei = gwei_to_wei(initial_base_fee_gwei)
-    
-    for idx, row in df_clean.iterrows():
-        if idx == 0:
-            # First block uses initial base fee
-            base_fee_wei = prev_base_fee_wei
-        else:
-            # Get parent block's data (previous row)
-            parent_row = df_clean.iloc[idx - 1]
-            # Calculate base fee using EIP-1559 formula based on parent block's data
-            base_fee_wei = calculate_base_fee(
-                prev_base_fee_wei, 
-                parent_row['Gas Used'], 
-                parent_row['Gas Limit'],
-                elasticity,
-                denominator
-            )
-        
-        base_fees_gwei.append(wei_to_gwei(base_fee_wei))
-        prev_base_fee_wei = base_fee_wei
+    if denominator is None:
+        denominator = DENOMINATOR
+    
+    # Columns are passed in their downcast unsigned dtype; the kernel widens per element
+    gas_used = df_clean['Gas Used'].to_numpy()
+    gas_limit = df_clean['Gas Limit'].to_numpy()
+    init_wei = gwei_to_wei(initial_base_fee_gwei)
+    try:
+        base_fees_wei = _recurrence(gas_used, gas_limit, elasticity, denominator, init_wei)
+    except OverflowError:
+        print("Base fee exceeds int64 for elasticity {}, denominator {}; recomputing with Python integers".format(elasticity, denominator))
+        base_fees_wei = _recurrence_exact(gas_used, gas_limit, elasticity, denominator, init_wei)
+        return np.array([wei_to_gwei(base_fee) for base_fee in base_fees_wei])
     
-    return base_fees_gwei
+    return wei_to_gwei(base_fees_wei)
 
 def calculate_base_fees_for_elasticity_and_denominator(df_clean, initial_base_fee_gwei, elasticity, denominator):
     """Calculate base fees for a specific elasticity and denominator combination"""
-    base_fees_gwei = []
-    prev_base_fee_wei = gwei_to_wei(initial_base_fee_gwei)
-    
-    for idx, row in df_clean.iterrows():
-        if idx == 0:
-            # First block uses initial base fee
-            base_fee_wei = prev_base_fee_wei
-        else:
-            # Get parent block's data (previous row)
-            parent_row = df_clean.iloc[idx - 1]
-            # Calculate base fee using EIP-1559 formula based on parent block's data with custom denominator
-            base_fee_wei = calculate_base_fee(
-                prev_base_fee_wei, 
-                parent_row['Gas Used'], 
-                parent_row['Gas Limit'],
-                elasticity,
-                denominator
-            )
-        
-        base_fees_gwei.append(wei_to_gwei(base_fee_wei))
-        prev_base_fee_wei = base_fee_wei
-    
-    return base_fees_gwei
+    return calculate_base_fees_for_elasticity(df_clean, initial_base_fee_gwei, elasticity, denominator)
 
 def main():
     parser = argparse.ArgumentParser(description='Calculate and draw base fee from block data with different elasticity values')
@@ -125,6 +140,8 @@ def main():
                        help='Output plot filename (default: base_fee_elasticity_comparison.png)')
     parser.add_argument('--show-gas-usage', action='store_true',
                        help='Show gas usage ratio on secondary y-axis')
+    parser.add_argument('--show', action='store_true',
+                       help='Display the plot in a window after saving it')
     
     args = parser.parse_args()
     
@@ -150,16 +167,19 @@ def main():
         print("Error: CSV file '{}' not found".format(args.csv))
         return
     
-    # Read CSV data
+    required_columns = ['Block Number', 'Gas Used', 'Gas Limit']
+    
+    # Read CSV data, only loading the columns we use; gas columns stay strings until
+    # the 'ERROR' placeholder rows are dropped
     try:
-        df = pd.read_csv(args.csv)
+        df = pd.read_csv(args.csv, usecols=lambda col: col in required_columns,
+                         dtype={'Block Number': np.uint64, 'Gas Used': str, 'Gas Limit': str}, engine='c')
         print("Loaded {} blocks from {}".format(len(df), args.csv))
     except Exception as e:
         print("Error reading CSV file: {}".format(e))
         return
     
     # Check required columns
-    required_columns = ['Block Number', 'Gas Used', 'Gas Limit']
     missing_columns = [col for col in required_columns if col not in df.columns]
     if missing_columns:
         print("Error: Missing required columns: {}".format(missing_columns))
@@ -171,10 +191,10 @@ def main():
         print("Error: No valid block data found in CSV")
         return
     
-    # Convert to numeric
-    df_clean['Block Number'] = pd.to_numeric(df_clean['Block Number'])
-    df_clean['Gas Used'] = pd.to_numeric(df_clean['Gas Used'])
-    df_clean['Gas Limit'] = pd.to_numeric(df_clean['Gas Limit'])
+    # Convert to the smallest unsigned integer dtype that holds each column
+    df_clean['Block Number'] = pd.to_numeric(df_clean['Block Number'], downcast='unsigned')
+    df_clean['Gas Used'] = pd.to_numeric(df_clean['Gas Used'], downcast='unsigned')
+    df_clean['Gas Limit'] = pd.to_numeric(df_clean['Gas Limit'], downcast='unsigned')
     
     # Sort by block number
     df_clean = df_clean.sort_values(by='Block Number', ignore_index=True)  # type: ignore
@@ -350,13 +370,19 @@ def main():
     
     # Save calculated data
     output_csv = args.output.replace('.png', '_data.csv')
-    df_output = df_clean[['Block Number', 'Gas Used', 'Gas Limit']].copy()
-    for elasticity in comparison_values:
-        df_output['Base_Fee_{}'.format(plot_labels[comparison_values.index(elasticity)])] = all_base_fees[elasticity]
-    df_output.to_csv(output_csv, index=False)
+    header = ','.join(['Block Number', 'Gas Used', 'Gas Limit'] + ['Base_Fee_{}'.format(label) for label in plot_labels])
+    output_data = np.column_stack(
+        [df_clean[col].to_numpy() for col in ['Block Number', 'Gas Used', 'Gas Limit']] +
+        [all_base_fees[value] for value in comparison_values]
+    )
+    # Every series comes from _recurrence in whole wei, so 9 decimals in gwei is lossless
+    np.savetxt(output_csv, output_data, delimiter=',', header=header, comments='',
+               fmt=['%d'] * 3 + ['%.9f'] * len(comparison_values))
     print("\nCalculated data saved as {}".format(output_csv))
     
-    plt.show()
+    if args.show:
+        plt.show()
+    plt.close(fig)
 
 if __name__ == "__main__":
     main()
@@ -67,14 +67,12 @@ def calculate_base_fees_for_speed_limit(df_clean, initial_base_fee_gwei, speed_l
     gas_backlog = 0  # Start with no backlog
     min_base_fee_wei = gwei_to_wei(initial_base_fee_gwei)
     
-    for idx, row in df_clean.iterrows():
-        if idx == 0:
+    parent_gas_used = None
+    for (gas_used,) in df_clean[['Gas Used']].itertuples(index=False, name=None):
+        if parent_gas_used is None:
             # First block uses initial base fee
             base_fee_wei = min_base_fee_wei
         else:
-            # Get parent block's gas used (previous row)
-            parent_gas_used = df_clean.iloc[idx - 1]['Gas Used']
-            
             # Update gas backlog: last_backlog + parent_block_gas_used - block_time * speed_limit
             gas_backlog = gas_backlog + parent_gas_used - BLOCK_TIME * speed_limit
             
@@ -85,6 +83,8 @@ def calculate_base_fees_for_speed_limit(df_clean, initial_base_fee_gwei, speed_l
             base_fee_wei = calculate_base_fee_exponential(min_base_fee_wei, gas_backlog, speed_limit, tolerance, inertia)
         
         base_fees_gwei.append(wei_to_gwei(base_fee_wei))
+        # Current block becomes the parent of the next one
+        parent_gas_used = gas_used
     
     return base_fees_gwei
 
@@ -97,14 +97,12 @@ def calculate_base_fees_for_inertia(df_clean, initial_base_fee_gwei, speed_limit
     gas_backlog = 0  # Start with no backlog
     min_base_fee_wei = gwei_to_wei(initial_base_fee_gwei)
     
-    for idx, row in df_clean.iterrows():
-        if idx == 0:
+    parent_gas_used = None
+    for (gas_used,) in df_clean[['Gas Used']].itertuples(index=False, name=None):
+        if parent_gas_used is None:
             # First block uses initial base fee
             base_fee_wei = min_base_fee_wei
         else:
-            # Get parent block's gas used (previous row)
-            parent_gas_used = df_clean.iloc[idx - 1]['Gas Used']
-            
             # Update gas backlog: last_backlog + parent_block_gas_used - block_time * speed_limit
             gas_backlog = gas_backlog + parent_gas_used - BLOCK_TIME * speed_limit
             
@@ -115,6 +113,8 @@ def calculate_base_fees_for_inertia(df_clean, initial_base_fee_gwei, speed_limit
             base_fee_wei = calculate_base_fee_exponential(min_base_fee_wei, gas_backlog, speed_limit, tolerance, inertia)
         
         base_fees_gwei.append(wei_to_gwei(base_fee_wei))
+        # Current block becomes the parent of the next one
+        parent_gas_used = gas_used
     
     return base_fees_gwei
 
@@ -1,100 +1,200 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+from numba import njit, prange
+import argparse
 import datetime
+import os
 import matplotlib.pyplot as plt
 
+@njit(parallel=True, fastmath=True, cache=True)
+def grouped_mae(x, y, starts, ends, a, b, out):
+    """Mean absolute error of y ~ a[g] + b[g] * x over each row range [starts[g], ends[g])"""
+    for g in prange(len(starts)):
+        s = 0.0
+        for i in range(starts[g], ends[g]):
+            s += abs(y[i] - a[g] - b[g] * x[i])
+        out[g] = s / (ends[g] - starts[g])
+
+@njit(parallel=True, fastmath=True, cache=True)
+def grand_mae(x, y, a, b):
+    """Mean absolute error of y ~ a + b * x over all rows"""
+    s = 0.0
+    for i in prange(len(x)):
+        s += abs(y[i] - a - b * x[i])
+    return s / len(x)
+
+def _time_axis(ax, title, ylabel):
+    """Apply the styling shared by the monthly time-series axes"""
+    ax.set_xlabel('Month', fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', rotation=45)
+    ax.legend()
+
+parser = argparse.ArgumentParser(description='Fit zlib_best against fastlz per month and plot the results')
+parser.add_argument('--dpi', type=int, default=150,
+                    help='Resolution of the saved plots (default: 150, use 300 for publication)')
+parser.add_argument('--no-cache', action='store_true',
+                    help='Refit from the data file without reading or writing the results cache')
+args = parser.parse_args()
+
+# Let Agg simplify and chunk long line paths instead of stroking every segment
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
+plt.rcParams['agg.path.chunksize'] = 10000
+
 dt = np.dtype([('block', '<u4'), ('best', '<u4'), ('fastlz', '<u4'), ('zeroes', '<u4'), ('ones', '<u4')])
-op_mainnet = np.fromfile('./data/fastlz.bin', dtype=dt)
-input_array = np.array(op_mainnet.tolist())
-print(f'input_array length: {len(input_array)}')
-# base_mainnet = np.fromfile('./base-mainnet.bin', dtype=dt)
-# input_array = np.concatenate((input_array, np.array(base_mainnet.tolist())))
+data_path = './data/fastlz.bin'
+cache_dir = './.cache'
 
 op_mainnet_genesis_time = datetime.datetime.fromtimestamp(1728130312)
 op_mainnet_genesis_block = 70000000
 block_time = 2
 signature_omitted = False
+genesis_timestamp = int(op_mainnet_genesis_time.timestamp())
 
-blocks_per_day = 60*60*24 // block_time
+# Bump whenever fit_regressions changes what it computes, so stale cached results are not reused
+fit_version = 3
 
-# Group data by month
-# Calculate month index (year*12 + month) for each block
-genesis_timestamp = int(op_mainnet_genesis_time.timestamp())
-month_indices = []
-for block_num in input_array[:, 0]:
-    block_timestamp = genesis_timestamp + (block_num - op_mainnet_genesis_block) * block_time
-    block_date = datetime.datetime.fromtimestamp(block_timestamp).date()
-    month_idx = block_date.year * 12 + block_date.month - 1
-    month_indices.append(month_idx)
+blocks_per_day = 60*60*24 // block_time
 
-month_indices = np.array(month_indices)
-unique_months = np.sort(np.unique(month_indices))
+def fit_regressions(path):
+    """Fit fastlz -> zlib_best per month and on all data, returning the arrays and scalars to plot"""
+    op_mainnet = np.fromfile(path, dtype=dt)
+    # base_mainnet = np.fromfile('./base-mainnet.bin', dtype=dt)
+    # op_mainnet = np.concatenate((op_mainnet, base_mainnet))
+    print(f'op_mainnet length: {len(op_mainnet)}')
+    
+    # Copy the fields we use into dense columns and drop the 20-byte records, so later
+    # passes don't stride over the unused zeroes/ones fields
+    blocks = op_mainnet['block'].copy()
+    best = op_mainnet['best'].copy()
+    fastlz = op_mainnet['fastlz'].copy()
+    del op_mainnet
+    
+    # Group data by month
+    # Calculate month index (months since 1970-01, UTC) for each block
+    block_timestamps = genesis_timestamp + (blocks.astype(np.int64) - op_mainnet_genesis_block) * block_time
+    # Months since 1970 fit easily in int32, halving the index array and the argsort input
+    month_indices = block_timestamps.astype('datetime64[s]').astype('datetime64[M]').astype(np.int32)
+    unique_months = np.unique(month_indices)
+    
+    # Sort rows by month once so every month is a contiguous run; its bounds are two
+    # binary searches instead of a full equality scan over month_indices per month
+    order = np.argsort(month_indices, kind='stable')
+    sorted_month_indices = month_indices[order]
+    month_starts = np.searchsorted(sorted_month_indices, unique_months, side='left')
+    month_ends = np.searchsorted(sorted_month_indices, unique_months, side='right')
+    # Byte counts stay below 2**24, so float32 holds them exactly at half the size of float64
+    x_sorted = fastlz[order].astype(np.float32)
+    y_sorted = best[order].astype(np.float32)
+    
+    # Fit every month at once: ordinary least squares with one feature only needs the
+    # per-month sums below, and each is a single np.add.reduceat over the sorted rows.
+    # Products and sums are taken in float64 so the centered moments don't lose precision
+    sample_counts = month_ends - month_starts
+    sum_x = np.add.reduceat(x_sorted, month_starts, dtype=np.float64)
+    sum_y = np.add.reduceat(y_sorted, month_starts, dtype=np.float64)
+    sum_xx = np.add.reduceat(np.multiply(x_sorted, x_sorted, dtype=np.float64), month_starts)
+    sum_xy = np.add.reduceat(np.multiply(x_sorted, y_sorted, dtype=np.float64), month_starts)
+    sum_yy = np.add.reduceat(np.multiply(y_sorted, y_sorted, dtype=np.float64), month_starts)
+    
+    # Centered second moments
+    s_xx = sum_xx - sum_x * sum_x / sample_counts
+    s_xy = sum_xy - sum_x * sum_y / sample_counts
+    s_yy = sum_yy - sum_y * sum_y / sample_counts
+    
+    # A month with one row or a constant fastlz has s_xx == 0; its slope falls back to 0
+    # so the intercept is the mean of y, as sklearn's lstsq solution gives
+    coefficients = np.divide(s_xy, s_xx, out=np.zeros_like(s_xy), where=s_xx > 0)
+    intercepts = (sum_y - coefficients * sum_x) / sample_counts
+    ss_res = np.maximum(s_yy - coefficients * s_xy, 0)
+    
+    # With s_yy == 0 the fit is perfect and R² is 1, except for a single row where,
+    # like sklearn's r2_score, it is undefined
+    unexplained = np.divide(ss_res, s_yy, out=np.zeros_like(ss_res), where=s_yy > 0)
+    r2_scores = np.where(sample_counts > 1, 1 - unexplained, np.nan)
+    rmse_scores = np.sqrt(ss_res / sample_counts)
+    
+    # MAE is not a function of the sums, so it still needs a pass over the rows
+    mae_scores = np.empty(len(unique_months), dtype=np.float64)
+    grouped_mae(x_sorted, y_sorted, month_starts, month_ends, intercepts, coefficients, mae_scores)
+    
+    # Regression on all data, from the grand totals of the same sums
+    total_count = sample_counts.sum()
+    total_x = sum_x.sum()
+    total_y = sum_y.sum()
+    s_xx_all = sum_xx.sum() - total_x * total_x / total_count
+    s_xy_all = sum_xy.sum() - total_x * total_y / total_count
+    s_yy_all = sum_yy.sum() - total_y * total_y / total_count
+    
+    coef_all = s_xy_all / s_xx_all if s_xx_all > 0 else 0.0
+    intercept_all = (total_y - coef_all * total_x) / total_count
+    ss_res_all = max(s_yy_all - coef_all * s_xy_all, 0)
+    if total_count < 2:
+        r2_all = np.nan
+    else:
+        r2_all = 1 - ss_res_all / s_yy_all if s_yy_all > 0 else 1.0
+    
+    return {
+        'month_dates': unique_months.astype('datetime64[M]'),
+        'intercepts': intercepts,
+        'coefficients': coefficients,
+        'sample_counts': sample_counts,
+        'r2_scores': r2_scores,
+        'rmse_scores': rmse_scores,
+        'mae_scores': mae_scores,
+        'intercept_all': intercept_all,
+        'coef_all': coef_all,
+        'r2_all': r2_all,
+        'rmse_all': np.sqrt(ss_res_all / total_count),
+        'mae_all': grand_mae(x_sorted, y_sorted, intercept_all, coef_all),
+        'total_count': total_count,
+    }
 
-# Regression on all data
-print("\n=== Regression on All Data ===")
-x_all = input_array[:, 2].reshape(-1, 1)  # fastlz column, reshaped to 2D
-y_all = input_array[:, 1]  # best column
+# Reuse results from a previous run on the same input file (identified by size and mtime)
+# with the same fit code and the same block -> month mapping
+data_stat = os.stat(data_path)
+cache_path = os.path.join(cache_dir, f'regression_v{fit_version}_{data_stat.st_size}_{data_stat.st_mtime_ns}_'
+                                     f'{op_mainnet_genesis_block}_{genesis_timestamp}_{block_time}.npz')
+if args.no_cache:
+    results = fit_regressions(data_path)
+elif os.path.exists(cache_path):
+    print(f'Loading cached regression results from {cache_path}')
+    with np.load(cache_path) as cached:
+        results = {key: cached[key] for key in cached.files}
+else:
+    results = fit_regressions(data_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(cache_path, **results)
 
-all_data_model = LinearRegression().fit(x_all, y_all)
-y_pred_all = all_data_model.predict(x_all)
-r2_all = r2_score(y_all, y_pred_all)
-rmse_all = np.sqrt(mean_squared_error(y_all, y_pred_all))
-mae_all = mean_absolute_error(y_all, y_pred_all)
+# Month indices are months since 1970-01, so they map straight onto datetime64[M],
+# which matplotlib plots natively and which formats as YYYY-MM
+month_dates = results['month_dates']
+month_labels = np.datetime_as_string(month_dates, unit='M')
+intercepts = results['intercepts']
+coefficients = results['coefficients']
+sample_counts = results['sample_counts']
+r2_scores = results['r2_scores']
+rmse_scores = results['rmse_scores']
+mae_scores = results['mae_scores']
+intercept_all = float(results['intercept_all'])
+coef_all = float(results['coef_all'])
+r2_all = float(results['r2_all'])
+rmse_all = float(results['rmse_all'])
+mae_all = float(results['mae_all'])
 
-print(f'All Data Model: zlib_best = {all_data_model.intercept_:.6f} + {all_data_model.coef_[0]:.6f} * fastlz')
+print("\n=== Regression on All Data ===")
+print(f'All Data Model: zlib_best = {intercept_all:.6f} + {coef_all:.6f} * fastlz')
 print(f'R² Score: {r2_all:.6f}')
 print(f'RMSE: {rmse_all:.6f}')
 print(f'MAE: {mae_all:.6f}')
-print(f'Sample Count: {len(input_array)}')
-
-# Store regression results for plotting
-month_labels = []
-intercepts = []
-coefficients = []
-sample_counts = []
-r2_scores = []
-rmse_scores = []
-mae_scores = []
+print(f'Sample Count: {int(results["total_count"])}')
 
 print("\n=== Monthly Regression Results ===")
 print(f'month,intercept,coefficient,sample_count,r2_score,rmse,mae')
-for month_idx in unique_months:
-    # Get data for this month
-    month_mask = month_indices == month_idx
-    month_data = input_array[month_mask]
-    
-    if len(month_data) == 0:
-        continue
-    
-    # Prepare training data
-    x_month = month_data[:, 2].reshape(-1, 1)  # fastlz column, reshaped to 2D
-    y_month = month_data[:, 1]  # best column
-    
-    # Train fastlz model for this month
-    fastlz_model = LinearRegression().fit(x_month, y_month)
-    
-    # Calculate metrics
-    y_pred_month = fastlz_model.predict(x_month)
-    r2_month = r2_score(y_month, y_pred_month)
-    rmse_month = np.sqrt(mean_squared_error(y_month, y_pred_month))
-    mae_month = mean_absolute_error(y_month, y_pred_month)
-    
-    # Get month date for display (convert month_idx back to year-month)
-    year = month_idx // 12
-    month = (month_idx % 12) + 1
-    month_str = f"{year}-{month:02d}"
-    
-    # Store results
-    month_labels.append(month_str)
-    intercepts.append(fastlz_model.intercept_)
-    coefficients.append(fastlz_model.coef_[0])
-    sample_counts.append(len(month_data))
-    r2_scores.append(r2_month)
-    rmse_scores.append(rmse_month)
-    mae_scores.append(mae_month)
-    
-    print(f'{month_str},{fastlz_model.intercept_:.6f},{fastlz_model.coef_[0]:.6f},{len(month_data)},{r2_month:.6f},{rmse_month:.6f},{mae_month:.6f}')
+for i, month_str in enumerate(month_labels):
+    print(f'{month_str},{intercepts[i]:.6f},{coefficients[i]:.6f},{sample_counts[i]},{r2_scores[i]:.6f},{rmse_scores[i]:.6f},{mae_scores[i]:.6f}')
 
 # Create visualizations
 print("\nCreating monthly regression visualization...")
@@ -102,34 +202,22 @@ print("\nCreating monthly regression visualization...")
 # Create figure with two subplots
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
 
-# Convert month labels to datetime for better x-axis formatting
-month_dates = [datetime.datetime.strptime(label, "%Y-%m") for label in month_labels]
-
 # Plot intercept over time
 ax1.plot(month_dates, intercepts, marker='o', linewidth=2, markersize=6, color='blue', alpha=0.7, label='Monthly')
-ax1.axhline(y=all_data_model.intercept_, color='green', linestyle='--', linewidth=2, label=f'All Data (intercept={all_data_model.intercept_:.2f})')
-ax1.set_xlabel('Month', fontsize=12)
-ax1.set_ylabel('Intercept', fontsize=12)
-ax1.set_title('Monthly Regression Intercept Over Time', fontsize=14, fontweight='bold')
-ax1.grid(True, alpha=0.3)
-ax1.tick_params(axis='x', rotation=45)
-ax1.legend()
+ax1.axhline(y=intercept_all, color='green', linestyle='--', linewidth=2, label=f'All Data (intercept={intercept_all:.2f})')
+_time_axis(ax1, 'Monthly Regression Intercept Over Time', 'Intercept')
 
 # Format x-axis dates
 fig.autofmt_xdate()
 
 # Plot coefficient over time
 ax2.plot(month_dates, coefficients, marker='s', linewidth=2, markersize=6, color='red', alpha=0.7, label='Monthly')
-ax2.axhline(y=all_data_model.coef_[0], color='green', linestyle='--', linewidth=2, label=f'All Data (coef={all_data_model.coef_[0]:.6f})')
-ax2.set_xlabel('Month', fontsize=12)
-ax2.set_ylabel('FastLZ Coefficient', fontsize=12)
-ax2.set_title('Monthly Regression Coefficient (FastLZ) Over Time', fontsize=14, fontweight='bold')
-ax2.grid(True, alpha=0.3)
-ax2.tick_params(axis='x', rotation=45)
-ax2.legend()
+ax2.axhline(y=coef_all, color='green', linestyle='--', linewidth=2, label=f'All Data (coef={coef_all:.6f})')
+_time_axis(ax2, 'Monthly Regression Coefficient (FastLZ) Over Time', 'FastLZ Coefficient')
 
 plt.tight_layout()
-plt.savefig('monthly_regression_results.png', dpi=300, bbox_inches='tight')
+plt.savefig('monthly_regression_results.png', dpi=args.dpi, bbox_inches='tight')
+plt.close(fig)
 print(f"Visualization saved as 'monthly_regression_results.png'")
 
 # Create a combined plot showing both metrics
@@ -137,7 +225,7 @@ fig2, ax = plt.subplots(figsize=(14, 6))
 
 # Plot intercept on left y-axis
 ax.plot(month_dates, intercepts, marker='o', linewidth=2, markersize=6, color='blue', alpha=0.7, label='Intercept (Monthly)')
-ax.axhline(y=all_data_model.intercept_, color='green', linestyle='--', linewidth=2, label=f'Intercept (All Data)')
+ax.axhline(y=intercept_all, color='green', linestyle='--', linewidth=2, label=f'Intercept (All Data)')
 ax.set_xlabel('Month', fontsize=12)
 ax.set_ylabel('Intercept', fontsize=12, color='blue')
 ax.tick_params(axis='y', labelcolor='blue')
@@ -146,7 +234,7 @@ ax.tick_params(axis='x', rotation=45)
 # Plot coefficient on right y-axis
 ax2_right = ax.twinx()
 ax2_right.plot(month_dates, coefficients, marker='s', linewidth=2, markersize=6, color='red', alpha=0.7, label='Coefficient (Monthly)')
-ax2_right.axhline(y=all_data_model.coef_[0], color='orange', linestyle='--', linewidth=2, label=f'Coefficient (All Data)')
+ax2_right.axhline(y=coef_all, color='orange', linestyle='--', linewidth=2, label=f'Coefficient (All Data)')
 ax2_right.set_ylabel('FastLZ Coefficient', fontsize=12, color='red')
 ax2_right.tick_params(axis='y', labelcolor='red')
 
@@ -160,7 +248,8 @@ ax.legend(lines1 + lines2, labels1 + labels2, loc='best')
 
 fig2.autofmt_xdate()
 plt.tight_layout()
-plt.savefig('monthly_regression_combined.png', dpi=300, bbox_inches='tight')
+plt.savefig('monthly_regression_combined.png', dpi=args.dpi, bbox_inches='tight')
+plt.close(fig2)
 print(f"Combined visualization saved as 'monthly_regression_combined.png'")
 
 # Create visualization for regression quality metrics
@@ -169,34 +258,20 @@ fig3, (ax3, ax4, ax5) = plt.subplots(3, 1, figsize=(14, 12))
 # Plot R² scores
 ax3.plot(month_dates, r2_scores, marker='o', linewidth=2, markersize=6, color='purple', alpha=0.7)
 ax3.axhline(y=r2_all, color='green', linestyle='--', linewidth=2, label=f'All Data (R²={r2_all:.6f})')
-ax3.set_xlabel('Month', fontsize=12)
-ax3.set_ylabel('R² Score', fontsize=12)
-ax3.set_title('Monthly Regression R² Score Over Time', fontsize=14, fontweight='bold')
-ax3.grid(True, alpha=0.3)
-ax3.tick_params(axis='x', rotation=45)
-ax3.legend()
+_time_axis(ax3, 'Monthly Regression R² Score Over Time', 'R² Score')
 
 # Plot RMSE
 ax4.plot(month_dates, rmse_scores, marker='s', linewidth=2, markersize=6, color='orange', alpha=0.7)
 ax4.axhline(y=rmse_all, color='green', linestyle='--', linewidth=2, label=f'All Data (RMSE={rmse_all:.2f})')
-ax4.set_xlabel('Month', fontsize=12)
-ax4.set_ylabel('RMSE', fontsize=12)
-ax4.set_title('Monthly Regression RMSE Over Time', fontsize=14, fontweight='bold')
-ax4.grid(True, alpha=0.3)
-ax4.tick_params(axis='x', rotation=45)
-ax4.legend()
+_time_axis(ax4, 'Monthly Regression RMSE Over Time', 'RMSE')
 
 # Plot MAE
 ax5.plot(month_dates, mae_scores, marker='^', linewidth=2, markersize=6, color='brown', alpha=0.7)
 ax5.axhline(y=mae_all, color='green', linestyle='--', linewidth=2, label=f'All Data (MAE={mae_all:.2f})')
-ax5.set_xlabel('Month', fontsize=12)
-ax5.set_ylabel('MAE', fontsize=12)
-ax5.set_title('Monthly Regression MAE Over Time', fontsize=14, fontweight='bold')
-ax5.grid(True, alpha=0.3)
-ax5.tick_params(axis='x', rotation=45)
-ax5.legend()
+_time_axis(ax5, 'Monthly Regression MAE Over Time', 'MAE')
 
 fig3.autofmt_xdate()
 plt.tight_layout()
-plt.savefig('monthly_regression_metrics.png', dpi=300, bbox_inches='tight')
+plt.savefig('monthly_regression_metrics.png', dpi=args.dpi, bbox_inches='tight')
+plt.close(fig3)
 print(f"Metrics visualization saved as 'monthly_regression_metrics.png'")